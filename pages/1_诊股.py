@@ -8,50 +8,132 @@ Provides the user interface for the LiangZiXuanGu AI Agent.
 import streamlit as st
 from datetime import datetime, timedelta
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 from langgraph.graph import END
 
 # Import the compiled graph app from our workflow module
 from src.graph_workflow import app
 from src.analysis_handler import get_available_indicators
+from src.ui.chart import COLUMN_MAP, create_candlestick_chart, highlight_signals
 
 # Try to set locale for date formatting
 import locale
+import math
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+# Sentinel pushed onto the event queue once the workflow stream is exhausted
+_STREAM_DONE = object()
+
+def stream_workflow_in_background(initial_state: dict):
+    """
+    Runs app.stream in a worker thread and yields its events from a queue,
+    so the Streamlit script thread only drains events instead of driving the
+    whole LLM workflow. Exceptions raised in the worker are re-raised here.
+    """
+    events = queue.Queue()
+
+    def _run():
+        try:
+            for event in app.stream(initial_state):
+                events.put(event)
+        except Exception as e:
+            events.put(e)
+        finally:
+            events.put(_STREAM_DONE)
 
-def create_candlestick_chart(df: pd.DataFrame):
-    """Creates an interactive Candlestick chart with MAs and MACD using Plotly."""
-    if df.empty:
-        return go.Figure()
-
-    # Calculate Moving Averages
-    df['ma10'] = df['close'].rolling(window=10).mean()
-    df['ma20'] = df['close'].rolling(window=20).mean()
-
-    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, 
-                        vertical_spacing=0.05, subplot_titles=('K线与移动平均线', 'MACD'), 
-                        row_heights=[0.7, 0.3])
-
-    fig.add_trace(go.Candlestick(x=df['date'], open=df['open'], high=df['high'], low=df['low'], close=df['close'], name="K线"), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df['date'], y=df['ma10'], mode='lines', name='MA10', line=dict(color='orange', width=1)), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df['date'], y=df['ma20'], mode='lines', name='MA20', line=dict(color='purple', width=1)), row=1, col=1)
-
-    colors = ['green' if val >= 0 else 'red' for val in df['macdhist']]
-    fig.add_trace(go.Bar(x=df['date'], y=df['macdhist'], name='MACD Hist', marker_color=colors), row=2, col=1)
-    fig.add_trace(go.Scatter(x=df['date'], y=df['macd'], mode='lines', name='MACD'), row=2, col=1)
-    fig.add_trace(go.Scatter(x=df['date'], y=df['macdsignal'], mode='lines', name='Signal'), row=2, col=1)
-
-    fig.update_layout(title_text='股价走势与技术指标', xaxis_rangeslider_visible=False, height=600, legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-    fig.update_yaxes(title_text="价格", row=1, col=1)
-    fig.update_yaxes(title_text="MACD", row=2, col=1)
-
-    return fig
-
-def main():
-    # Set locale to Chinese for date formatting
+    executor = ThreadPoolExecutor(max_workers=1)
+    executor.submit(_run)
+    try:
+        while True:
+            item = events.get()
+            if item is _STREAM_DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        executor.shutdown(wait=False)
+
+# Columns (after translation) grouped by the formatter they use
+COLS_2_DECIMAL_NO_ROUND = [
+    '开盘', '收盘', '最高', '最低', '振幅', 'RSI', 'MACD',
+    'Signal', 'Hist', 'MA10', 'MA20', 'K', 'D', 'OBV', '布林上轨', '布林中轨', '布林下轨'
+]
+COLS_PERCENTAGE = ['涨跌幅', '换手率']
+COLS_AMOUNT = ['成交额']
+COLS_DATE = ['日期']
+
+# Custom formatter for 2 decimal places, no rounding
+def format_two_decimals_no_round(val):
+    if isinstance(val, (int, float)):
+        if math.isnan(val):
+            return ""
+        # Truncate to 2 decimal places
+        truncated_val = math.floor(val * 100) / 100 if val >= 0 else math.ceil(val * 100) / 100
+        return f"{truncated_val:.2f}"
+    return val
+
+# Custom formatter for amount (成交额)
+def format_amount(val):
+    if isinstance(val, (int, float)):
+        if math.isnan(val):
+            return ""
+        if val >= 100000000: # 亿
+            return f"{val / 100000000:.4f}亿"
+        elif val >= 10000: # 万
+            return f"{val / 10000:.4f}万"
+        else:
+            return f"{val:.2f}" # Keep 2 decimal places for smaller amounts
+    return val
+
+# Custom formatter for date (YYYY-MM-DD)
+def format_date_only(val):
+    if isinstance(val, (datetime, pd.Timestamp)):
+        return val.strftime("%Y-%m-%d")
+    return val
+
+# Custom formatter for percentage (no rounding, with %)
+def format_percentage_no_round(val):
+    if isinstance(val, (int, float)):
+        if math.isnan(val):
+            return ""
+        truncated_val = math.floor(val * 100) / 100 if val >= 0 else math.ceil(val * 100) / 100
+        return f"{truncated_val:.2f}%"
+    return val
+
+def build_formatters(columns) -> dict:
+    """Maps each present (translated) column to its display formatter."""
+    formatters = {}
+    for cols, formatter in ((COLS_2_DECIMAL_NO_ROUND, format_two_decimals_no_round),
+                            (COLS_PERCENTAGE, format_percentage_no_round),
+                            (COLS_AMOUNT, format_amount),
+                            (COLS_DATE, format_date_only)):
+        for col in cols:
+            if col in columns:
+                formatters[col] = formatter
+    return formatters
+
+@st.cache_data(show_spinner=False)
+def render_signal_table_html(display_df: pd.DataFrame) -> str:
+    """
+    Renders the formatted, signal-highlighted table to HTML once.
+    The Styler/Jinja2 pass is cached, so reruns with the same data reuse the string.
+    """
+    styled_df = display_df.style.format(build_formatters(display_df.columns))
+    return styled_df.apply(highlight_signals, subset=['策略信号']).to_html()
+
+@st.cache_resource(show_spinner=False)
+def _init_locale() -> bool:
+    """Sets the Chinese time locale once per process instead of on every rerun."""
     try:
         locale.setlocale(locale.LC_TIME, 'zh_CN')
     except locale.Error:
+        return False
+    return True
+
+def main():
+    # Set locale to Chinese for date formatting
+    if not _init_locale():
         st.warning("无法设置中文本地化，日期选择器可能仍为英文。请确保系统支持 'chinese' 区域设置。")
         
     st.set_page_config(page_title="LiangZiXuanGu - 量子选股", layout="wide")
@@ -91,80 +173,24 @@ def main():
         final_report_container = st.container()
         chart_container = st.container() # Chart will still be displayed at the end
 
-        # --- Column Name Translation Map ---
-        COLUMN_MAP = {
-            'date': '日期', 'open': '开盘', 'close': '收盘', 'high': '最高', 'low': '最低',
-            'volume': '成交量', 'amount': '成交额', 'amplitude': '振幅', 'pct_chg': '涨跌幅',
-            'change': '涨跌额', 'turnover': '换手率', 'rsi': 'RSI', 'macd': 'MACD',
-            'macdsignal': 'Signal', 'macdhist': 'Hist', 'ma20': 'MA20', 'k': 'K', 'd': 'D',
-            'obv': 'OBV', 'bbands_upper': '布林上轨', 'bbands_middle': '布林中轨', 'bbands_lower': '布林下轨',
-            'signal': '策略信号'
-        }
-        
-        import math
-
-        # Custom formatter for 2 decimal places, no rounding
-        def format_two_decimals_no_round(val):
-            if isinstance(val, (int, float)):
-                if math.isnan(val):
-                    return ""
-                # Truncate to 2 decimal places
-                truncated_val = math.floor(val * 100) / 100 if val >= 0 else math.ceil(val * 100) / 100
-                return f"{truncated_val:.2f}"
-            return val
-
-        # Custom formatter for amount (成交额)
-        def format_amount(val):
-            if isinstance(val, (int, float)):
-                if math.isnan(val):
-                    return ""
-                if val >= 100000000: # 亿
-                    return f"{val / 100000000:.4f}亿"
-                elif val >= 10000: # 万
-                    return f"{val / 10000:.4f}万"
-                else:
-                    return f"{val:.2f}" # Keep 2 decimal places for smaller amounts
-            return val
-        
-        # Custom formatter for date (YYYY-MM-DD)
-        def format_date_only(val):
-            if isinstance(val, (datetime, pd.Timestamp)):
-                return val.strftime("%Y-%m-%d")
-            return val
-
-        # Custom formatter for percentage (no rounding, with %)
-        def format_percentage_no_round(val):
-            if isinstance(val, (int, float)):
-                if math.isnan(val):
-                    return ""
-                truncated_val = math.floor(val * 100) / 100 if val >= 0 else math.ceil(val * 100) / 100
-                return f"{truncated_val:.2f}%"
-            return val
-
-        # Define highlight function for dataframe
-        def highlight_signals(s):
-            return ['background-color: #90EE90' if v == 1 else '' for v in s]
-
         last_known_state = {}
         st.markdown("### 分析流程")
         data_details_expander = st.expander("详细数据", expanded=True)
         ai_summary_expander = st.expander("AI技术面总结", expanded=True)
+        # Single slots per expander: each render overwrites instead of appending
+        df_slot = data_details_expander.empty()
+        summary_slot = ai_summary_expander.empty()
 
         try:
             with st.spinner("AI Agent 正在工作中，请稍候..."):
-                # Debugging: Check what app.stream returns
-                stream_result = app.stream(initial_state)
-                if stream_result is None:
-                    st.error("错误：工作流流式处理返回了 None。这通常意味着工作流在启动时就遇到了问题，例如API Key未设置或无效。请检查您的配置和日志。")
-                    return # Exit if stream is None
-
-                for event in stream_result: # Iterate over the result
+                # The workflow runs in a background thread; events are drained here
+                for event in stream_workflow_in_background(initial_state):
                     for key, value in event.items():
                         last_known_state.update(value) # Continuously update state
                         
                         # Update AI Summary Expander (now includes strategy summary)
                         if "technical_summary" in value or "strategy_summary" in value:
-                            with ai_summary_expander:
+                            with summary_slot.container():
                                 st.subheader("AI技术面总结与策略信号：")
                                 if "technical_summary" in value:
                                     st.markdown(value["technical_summary"])
@@ -178,40 +204,18 @@ def main():
             # Display Data Table in expander after stream is complete
             df_analyzed = last_known_state.get("analyzed_data")
             if isinstance(df_analyzed, pd.DataFrame) and not df_analyzed.empty:
-                with data_details_expander:
+                with df_slot.container():
                     st.subheader("带指标的详细数据：")
-                    display_df = df_analyzed.copy()
+                    # The chart-only color column is not meant for the table
+                    display_df = df_analyzed.drop(columns=['macdhist_color'], errors='ignore')
                     display_df.rename(columns={k: v for k, v in COLUMN_MAP.items() if k in display_df.columns}, inplace=True)
-                    # Define columns to apply specific formatting
-                    cols_2_decimal_no_round = [
-                        '开盘', '收盘', '最高', '最低', '振幅', 'RSI', 'MACD',
-                        'Signal', 'Hist', 'MA20', 'K', 'D', 'OBV', '布林上轨', '布林中轨', '布林下轨'
-                    ]
-                    cols_percentage = ['涨跌幅', '换手率']
-                    cols_amount = ['成交额']
-                    cols_date = ['日期']
-
-                    # Create a dictionary of formatters
-                    formatters = {}
-                    for col in cols_2_decimal_no_round:
-                        if col in display_df.columns:
-                            formatters[col] = format_two_decimals_no_round
-                    for col in cols_percentage:
-                        if col in display_df.columns:
-                            formatters[col] = format_percentage_no_round
-                    for col in cols_amount:
-                        if col in display_df.columns:
-                            formatters[col] = format_amount
-                    for col in cols_date:
-                        if col in display_df.columns:
-                            formatters[col] = format_date_only
-
-                    styled_df = display_df.style.format(formatters)
-
                     if '策略信号' in display_df.columns:
-                        st.dataframe(styled_df.apply(highlight_signals, subset=['策略信号']))
+                        table_html = render_signal_table_html(display_df)
+                        st.markdown(f'<div style="max-height: 500px; overflow: auto;">{table_html}</div>', unsafe_allow_html=True)
                     else:
-                        st.dataframe(styled_df)
+                        # Arrow-backed columns let st.dataframe skip per-cell boxing during serialization
+                        display_df = display_df.convert_dtypes(dtype_backend='pyarrow')
+                        st.dataframe(display_df.style.format(build_formatters(display_df.columns), na_rep=""))
 
             # 1. Display Final Report
             final_report_container.markdown("### 📈 最终投研报告")
@@ -6,11 +6,10 @@ Streamlit page for stock screening based on defined strategies.
 
 import streamlit as st
 from datetime import datetime, timedelta
-import pandas as pd
 
 # Import the screening workflow app
 from src.screening_workflow import screening_app
-from src.screening_handler import get_stock_universe, _prepare_detailed_signals_for_display
+from src.screening_handler import get_stock_universe_df, get_industry_list, _prepare_detailed_signals_for_display
 
 def main():
     st.set_page_config(page_title="策略选股", layout="wide")
@@ -38,11 +37,10 @@ def main():
         with col2: # Right column
             # Change button text and functionality
             if st.button("更新板块数据", use_container_width=True): # Changed button text
-                get_stock_universe(force_refresh=True)
+                get_stock_universe_df(force_refresh=True)
                 st.success("股票池已刷新！")
 
-            universe_data = get_stock_universe()
-            all_industries = sorted(list(set([item.get('所属行业', '未知') for item in universe_data])))
+            all_industries = get_industry_list()
             
             st.markdown("#### 选择行业/板块") # New sub-header for checkboxes
 
@@ -162,18 +160,15 @@ def main():
 
             # --- Final Display after stream is complete ---
             if final_screening_state and not final_screening_state.get("error"):
-                found_signals = final_screening_state.get("found_signals", [])
-                if found_signals:
+                found_signals = final_screening_state.get("found_signals")
+                if found_signals is not None and not found_signals.empty:
                     status_text.success(f"选股完成！成功找到 {len(found_signals)} 个符合条件的股票！")
                     st.session_state.terminal_logs += f"选股完成！成功找到 {len(found_signals)} 个符合条件的股票！\n"
                     progress_bar.progress(100) # Final completion
 
                     st.markdown("#### 筛选结果概览")
-                    # Convert list of dicts to DataFrame for display
-                    signals_df = pd.DataFrame(found_signals)
-                    # Reorder columns for better display
-                    display_cols = ['stock_code', 'stock_name', 'industry', 'signal_date', 'signal_type']
-                    signals_df = signals_df[display_cols]
+                    # filter_signals already returns a DataFrame in display column order
+                    signals_df = found_signals
                     st.dataframe(signals_df, use_container_width=True)
 
                     st.markdown("#### 信号详情")
@@ -184,11 +179,9 @@ def main():
                     # Get unique stocks that have signals
                     unique_signal_stocks = signals_df[['stock_code', 'stock_name', 'industry', 'signal_type']].drop_duplicates()
 
-                    for _, stock_row in unique_signal_stocks.iterrows():
-                        stock_code = stock_row['stock_code']
-                        stock_name = stock_row['stock_name']
-                        industry = stock_row['industry']
-                        latest_signal_type = stock_row['signal_type'] # This is the type of signal that triggered the stock to be in found_signals
+                    # Plain tuples avoid boxing every row into a Series
+                    for stock_code, stock_name, industry, latest_signal_type in unique_signal_stocks.itertuples(index=False, name=None):
+                        # latest_signal_type is the type of signal that triggered the stock to be in found_signals
 
                         if stock_code in processed_stock_data:
                             df_with_signals = processed_stock_data[stock_code]
@@ -7,6 +7,9 @@ This module is designed to be flexible, allowing new indicators to be added easi
 
 import pandas as pd
 import talib
+import logging
+
+logger = logging.getLogger(__name__)
 
 # A registry to map indicator names to their calculation functions
 _indicator_functions = {}
@@ -116,7 +119,7 @@ def calculate_strategy_indicators(df: pd.DataFrame) -> pd.DataFrame:
     # 3. RSI (Relative Strength Index)
     df_out['rsi'] = talib.RSI(df_out['close'], timeperiod=14)
     
-    print("  - 已计算策略所需指标 (MA20, MA200, MACD, RSI)")
+    logger.debug("已计算策略所需指标 (MA20, MA200, MACD, RSI)")
     return df_out
 
 
@@ -7,12 +7,22 @@ Data handling module for fetching and processing stock data.
 import akshare as ak
 import pandas as pd
 from datetime import datetime, timedelta
-import struct # For binary parsing
+import numpy as np
 import os     # For path manipulation
-import json
 import time
+import glob
+import functools
+import hashlib
+import tempfile
+import threading
 from typing import List, Dict
 import concurrent.futures # For ThreadPoolExecutor
+import logging
+from cachetools.func import ttl_cache
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
 
 # --- Constants ---
 
@@ -21,56 +31,165 @@ TDX_ROOT_PATH = "D:\\new_tdx\\"
 
 # Define cache directory and file for stock universe
 CACHE_DIR = "cache"
-UNIVERSE_CACHE_FILE = os.path.join(CACHE_DIR, "stock_universe_cache.json")
+UNIVERSE_CACHE_FILE = os.path.join(CACHE_DIR, "stock_universe_cache.parquet")
+UNIVERSE_CACHE_HASH_FILE = UNIVERSE_CACHE_FILE + ".hash"
+UNIVERSE_COLUMNS = ['代码', '名称', '所属行业']
 CACHE_EXPIRATION_HOURS = 24 # Cache universe for 24 hours
 
+# Tongdaxin .day record layout: date, open/high/low/close (x100), amount, volume, reserved
+TDX_DAY_DTYPE = np.dtype([
+    ('date', '<u4'), ('open', '<u4'), ('high', '<u4'), ('low', '<u4'), ('close', '<u4'),
+    ('amount', '<f4'), ('volume', '<u4'), ('reserved', '<u4'),
+])
+
+# Per-stock daily frames are cached as parquet files named {code}_{start}_{end}.parquet
+DAILY_CACHE_DIR = os.path.join(CACHE_DIR, "daily")
+# Cached ranges that may still be missing their last day's bar are trusted only briefly
+RECENT_CACHE_TTL_MINUTES = 15
+
 
 # --- Helper Functions ---
 
 def _read_tdx_day_file(file_path: str) -> pd.DataFrame:
     """
     Reads a Tongdaxin .day binary file and returns a pandas DataFrame.
-    Each record is 32 bytes.
+    Each record is 32 bytes; the whole file is read once and decoded with numpy.
     """
-    records = []
     try:
         with open(file_path, 'rb') as f:
-            while True:
-                record_bytes = f.read(32)
-                if len(record_bytes) < 32:
-                    break
-                date_int, open_int, high_int, low_int, close_int, amount_float, volume_int, _ = struct.unpack('<IIIIIfII', record_bytes)
-                
-                date = pd.to_datetime(str(date_int), format='%Y%m%d')
-                open_price = open_int / 100.0
-                high_price = high_int / 100.0
-                low_price = low_int / 100.0
-                close_price = close_int / 100.0
-                volume = volume_int
-                amount = amount_float
-
-                records.append({
-                    'date': date,
-                    'open': open_price,
-                    'high': high_price,
-                    'low': low_price,
-                    'close': close_price,
-                    'volume': volume,
-                    'amount': amount
-                })
-        df = pd.DataFrame(records)
+            raw = f.read()
+        # Drop a trailing partial record, matching the old record-by-record reader
+        records = np.frombuffer(raw, dtype=TDX_DAY_DTYPE, count=len(raw) // TDX_DAY_DTYPE.itemsize)
+        df = pd.DataFrame({
+            'date': pd.to_datetime(records['date'].astype(str), format='%Y%m%d'),
+            'open': records['open'] / 100.0,
+            'high': records['high'] / 100.0,
+            'low': records['low'] / 100.0,
+            'close': records['close'] / 100.0,
+            'volume': records['volume'].astype(np.int64),
+            'amount': records['amount'].astype(np.float64),
+        })
         return df
     except Exception as e:
-        print(f"读取通达信本地文件 {file_path} 时发生错误: {e}")
+        logger.warning("读取通达信本地文件 %s 时发生错误: %s", file_path, e)
         return pd.DataFrame()
 
 
+def _parse_daily_cache_name(path: str):
+    """Splits a {code}_{start}_{end}.parquet cache path into its (start, end) dates."""
+    _, cached_start, cached_end = os.path.basename(path)[:-len(".parquet")].split("_")
+    return cached_start, cached_end
+
+def _load_cached_daily(cache_dir: str, stock_code: str, start_date: str, end_date: str, ttl_hours: int):
+    """
+    Returns a cached daily DataFrame covering [start_date, end_date], or None on a miss.
+    A fresh cache file with a wider date range is sliced down to the requested range.
+    A file written on or before end_date may lack that day's closing bar, so it is
+    only trusted for RECENT_CACHE_TTL_MINUTES.
+    """
+    now = datetime.now()
+    expires_before = now - timedelta(hours=ttl_hours)
+    recent_expires_before = max(expires_before, now - timedelta(minutes=RECENT_CACHE_TTL_MINUTES))
+    for path in glob.glob(os.path.join(cache_dir, f"{stock_code}_*_*.parquet")):
+        try:
+            cached_start, cached_end = _parse_daily_cache_name(path)
+            if cached_start > start_date or cached_end < end_date:
+                continue
+            modified = datetime.fromtimestamp(os.path.getmtime(path))
+            if modified.strftime("%Y%m%d") <= end_date:
+                if modified < recent_expires_before:
+                    continue
+            elif modified < expires_before:
+                continue
+            df = pd.read_parquet(path)
+            if (cached_start, cached_end) != (start_date, end_date):
+                df = df[(df['date'] >= pd.to_datetime(start_date, format='%Y%m%d')) &
+                        (df['date'] <= pd.to_datetime(end_date, format='%Y%m%d'))].reset_index(drop=True)
+            return df
+        except Exception as e:
+            logger.warning("读取日线缓存 %s 时发生错误: %s", path, e)
+    return None
+
+def _prune_cached_daily(cache_dir: str, stock_code: str, start_date: str, end_date: str, ttl_hours: int):
+    """Deletes the stock's other cache files that have expired or are covered by [start_date, end_date]."""
+    expires_before = datetime.now() - timedelta(hours=ttl_hours)
+    for path in glob.glob(os.path.join(cache_dir, f"{stock_code}_*_*.parquet")):
+        try:
+            cached_start, cached_end = _parse_daily_cache_name(path)
+            if (cached_start, cached_end) == (start_date, end_date):
+                continue
+            superseded = cached_start >= start_date and cached_end <= end_date
+            if superseded or datetime.fromtimestamp(os.path.getmtime(path)) < expires_before:
+                os.remove(path)
+        except (OSError, ValueError):
+            # Another session may have removed it already, or the file is still open on Windows
+            continue
+
+def _save_cached_daily(cache_dir: str, stock_code: str, start_date: str, end_date: str, df: pd.DataFrame, ttl_hours: int):
+    """
+    Writes a daily DataFrame to the parquet cache and prunes the stock's outdated files.
+    Each write goes through its own temp file, so concurrent writers never expose partial files.
+    """
+    tmp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f"{stock_code}_{start_date}_{end_date}.parquet")
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        os.close(fd)
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        tmp_path = None
+        _prune_cached_daily(cache_dir, stock_code, start_date, end_date, ttl_hours)
+    except Exception as e:
+        logger.warning("写入 %s 日线缓存时发生错误: %s", stock_code, e)
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Per-thread flag recording whether the thread's last disk_memoize call was a cache hit
+_disk_cache_state = threading.local()
+
+def last_call_was_cached() -> bool:
+    """Returns True if the calling thread's most recent disk_memoize call was served from disk."""
+    return getattr(_disk_cache_state, 'hit', False)
+
+def disk_memoize(ttl_hours: int = CACHE_EXPIRATION_HOURS, cache_dir: str = None):
+    """
+    A decorator that caches (stock_code, start_date, end_date) -> DataFrame results on disk.
+    Dates are expected in YYYYMMDD format. Empty results are not cached.
+    cache_dir defaults to DAILY_CACHE_DIR, looked up on each call so it can be redirected.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(stock_code: str, start_date: str = "20230101", end_date: str = None, **kwargs) -> pd.DataFrame:
+            if end_date is None:
+                end_date = datetime.now().strftime("%Y%m%d")
+            directory = cache_dir if cache_dir is not None else DAILY_CACHE_DIR
+            cached_df = _load_cached_daily(directory, stock_code, start_date, end_date, ttl_hours)
+            _disk_cache_state.hit = cached_df is not None
+            if cached_df is not None:
+                return cached_df
+            df = func(stock_code, start_date, end_date, **kwargs)
+            if df is not None and not df.empty:
+                _save_cached_daily(directory, stock_code, start_date, end_date, df, ttl_hours)
+            return df
+        return wrapper
+    return decorator
+
+
 # --- Main Data Functions ---
 
-def get_stock_daily(stock_code: str, start_date: str = "20230101", end_date: str = None) -> pd.DataFrame:
+@disk_memoize()
+def get_stock_daily(stock_code: str, start_date: str = "20230101", end_date: str = None, raise_errors: bool = False) -> pd.DataFrame:
     """
     获取指定股票代码的日线行情数据。
     优先从本地通达信数据读取，如果失败则回退到AkShare。
+    结果会按 (代码, 开始日期, 结束日期) 缓存到本地parquet文件，有效期24小时；
+    写入日期不晚于结束日期的缓存可能缺少结束日K线，只保留15分钟。
+
+    Args:
+        raise_errors (bool): 为True时，AkShare请求异常会直接抛出而不是返回空DataFrame，
+                             便于调用方区分“请求失败”(可重试) 与 “确实无数据”。
     """
     if end_date is None:
         end_date = datetime.now().strftime("%Y%m%d")
@@ -88,21 +207,23 @@ def get_stock_daily(stock_code: str, start_date: str = "20230101", end_date: str
             if os.path.exists(tdx_file_path):
                 tdx_data_df = _read_tdx_day_file(tdx_file_path)
                 if not tdx_data_df.empty:
-                    tdx_data_df['date'] = pd.to_datetime(tdx_data_df['date'])
-                    tdx_data_df = tdx_data_df[(tdx_data_df['date'] >= pd.to_datetime(start_date)) & 
-                                              (tdx_data_df['date'] <= pd.to_datetime(end_date))]
-                    print(f"成功从本地通达信获取 {stock_code} 的 {len(tdx_data_df)} 条数据。")
+                    # 'date' is already datetime64; parse the bounds once with an explicit format
+                    start_ts = pd.to_datetime(start_date, format='%Y%m%d')
+                    end_ts = pd.to_datetime(end_date, format='%Y%m%d')
+                    tdx_data_df = tdx_data_df[(tdx_data_df['date'] >= start_ts) & 
+                                              (tdx_data_df['date'] <= end_ts)]
+                    logger.debug("成功从本地通达信获取 %s 的 %d 条数据。", stock_code, len(tdx_data_df))
                     return tdx_data_df
     except Exception as e:
-        print(f"读取本地通达信数据时发生错误: {e}。将回退到AkShare。")
+        logger.warning("读取本地通达信数据时发生错误: %s。将回退到AkShare。", e)
         
     # 2. Fallback to AkShare
-    print(f"正在从AkShare获取股票 {stock_code} 从 {start_date} 到 {end_date} 的数据...")
+    logger.debug("正在从AkShare获取股票 %s 从 %s 到 %s 的数据...", stock_code, start_date, end_date)
     try:
         stock_zh_a_hist_df = ak.stock_zh_a_hist(symbol=stock_code, period="daily", start_date=start_date, end_date=end_date, adjust="qfq")
         
         if stock_zh_a_hist_df.empty:
-            print(f"警告: 未能从AkShare获取到股票 {stock_code} 的数据。")
+            logger.warning("未能从AkShare获取到股票 %s 的数据。", stock_code)
             return pd.DataFrame()
             
         stock_zh_a_hist_df.rename(columns={
@@ -111,18 +232,21 @@ def get_stock_daily(stock_code: str, start_date: str = "20230101", end_date: str
             '涨跌额': 'change', '换手率': 'turnover'
         }, inplace=True)
         
-        stock_zh_a_hist_df['date'] = pd.to_datetime(stock_zh_a_hist_df['date'])
-        print(f"成功从AkShare获取并处理了 {len(stock_zh_a_hist_df)} 条数据。")
+        # An explicit format skips per-call format inference
+        stock_zh_a_hist_df['date'] = pd.to_datetime(stock_zh_a_hist_df['date'], format='%Y-%m-%d')
+        logger.debug("成功从AkShare获取并处理了 %d 条数据。", len(stock_zh_a_hist_df))
         return stock_zh_a_hist_df
 
     except Exception as e:
-        print(f"从AkShare获取股票 {stock_code} 数据时发生错误: {e}")
+        if raise_errors:
+            raise
+        logger.warning("从AkShare获取股票 %s 数据时发生错误: %s", stock_code, e)
         return pd.DataFrame()
 
 def get_stock_universe(force_refresh: bool = False) -> List[Dict]:
     """
     获取完整的A股股票池，包含代码、名称和所属行业。
-    数据会被缓存24小时以提高性能。
+    这是 get_stock_universe_df 的列表形式包装，保留给需要字典列表的调用方。
 
     Args:
         force_refresh (bool): 如果为True，则强制从数据源刷新，忽略现有缓存。
@@ -131,24 +255,90 @@ def get_stock_universe(force_refresh: bool = False) -> List[Dict]:
         List[Dict]: 一个包含股票信息的字典列表。
                      示例: [{'代码': '000001', '名称': '平安银行', '所属行业': '银行'}]
     """
+    return get_stock_universe_df(force_refresh=force_refresh).to_dict(orient='records')
+
+def get_stock_universe_df(force_refresh: bool = False) -> pd.DataFrame:
+    """
+    获取完整的A股股票池 DataFrame，列为 UNIVERSE_COLUMNS。
+    数据会被缓存24小时以提高性能：同一进程内直接命中内存缓存，
+    冷启动或多进程时回退到磁盘缓存。返回的 DataFrame 为共享缓存，调用方不应原地修改。
+
+    Args:
+        force_refresh (bool): 如果为True，则强制从数据源刷新，忽略现有缓存。
+
+    Returns:
+        pd.DataFrame: 股票池，失败时为空 DataFrame。
+    """
+    if force_refresh:
+        _clear_universe_caches()
+        return _load_stock_universe(force_refresh=True)
+    universe_df = _get_cached_stock_universe_df()
+    if universe_df.empty:
+        # Do not keep a failed load in memory for the whole TTL
+        _clear_universe_caches()
+    return universe_df
+
+def get_industry_list() -> List[str]:
+    """
+    获取股票池中的全部行业（缺失行业记为“未知”），按名称排序。
+    排序结果与股票池一同缓存，界面每次重绘无需重新去重和排序。
+
+    Returns:
+        List[str]: 行业名称列表（调用方可自由修改的副本）。
+    """
+    industries = list(_get_cached_industry_list())
+    if not industries:
+        # An empty universe must not pin an empty industry list for the whole TTL
+        _get_cached_industry_list.cache_clear()
+    return industries
+
+@ttl_cache(maxsize=1, ttl=CACHE_EXPIRATION_HOURS * 3600)
+def _get_cached_stock_universe_df() -> pd.DataFrame:
+    """In-process memoization of the disk/network universe loader."""
+    return _load_stock_universe(force_refresh=False)
+
+@ttl_cache(maxsize=1, ttl=CACHE_EXPIRATION_HOURS * 3600)
+def _get_cached_industry_list() -> tuple:
+    """Sorted industries derived from the cached universe; a tuple so the cached value stays immutable."""
+    return tuple(sorted(get_stock_universe_df()['所属行业'].fillna('未知').unique()))
+
+def _clear_universe_caches():
+    """Drops the in-memory universe and everything derived from it."""
+    _get_cached_stock_universe_df.cache_clear()
+    _get_cached_industry_list.cache_clear()
+
+# Allows callers to drop the in-memory universe without forcing a network refresh
+get_stock_universe.cache_clear = _clear_universe_caches
+get_stock_universe_df.cache_clear = _clear_universe_caches
+
+def _load_stock_universe(force_refresh: bool = False) -> pd.DataFrame:
+    """
+    Loads the universe from the disk cache, or from AkShare when stale or forced.
+    The data stays columnar end to end; an empty DataFrame signals failure.
+    """
     print("正在获取股票池 (代码、名称、行业)...")
     
     os.makedirs(CACHE_DIR, exist_ok=True)
 
-    if not force_refresh and os.path.exists(UNIVERSE_CACHE_FILE):
-        last_modified_timestamp = os.path.getmtime(UNIVERSE_CACHE_FILE)
-        last_modified_datetime = datetime.fromtimestamp(last_modified_timestamp)
+    # One stat() both checks existence and yields the mtime on the cache-hit path
+    cache_stat = None
+    if not force_refresh:
+        try:
+            cache_stat = os.stat(UNIVERSE_CACHE_FILE)
+        except FileNotFoundError:
+            pass
+
+    if cache_stat is not None:
+        last_modified_datetime = datetime.fromtimestamp(cache_stat.st_mtime)
         
         if datetime.now() - last_modified_datetime < timedelta(hours=CACHE_EXPIRATION_HOURS):
             print("从缓存加载股票池...")
-            with open(UNIVERSE_CACHE_FILE, "r", encoding="utf-8") as f:
-                cache_data = json.load(f)
-            stock_data = cache_data['data']
-            print(f"已从缓存获取 {len(stock_data)} 只股票。")
-            return stock_data
+            universe_df = pq.read_table(UNIVERSE_CACHE_FILE, columns=UNIVERSE_COLUMNS, use_threads=True).to_pandas()
+            print(f"已从缓存获取 {len(universe_df)} 只股票。")
+            return universe_df
 
     print("从数据源获取股票池并更新缓存...")
-    stock_data = []
+    universe_df = pd.DataFrame(columns=UNIVERSE_COLUMNS)
     try:
         # --- 主方案: 获取东方财富所有行业及其成分股 ---
         industry_summary_df = ak.stock_board_industry_name_em()
@@ -176,52 +366,80 @@ def get_stock_universe(force_refresh: bool = False) -> List[Dict]:
             # Map the _fetch_industry_constituents function to each industry
             results = executor.map(_fetch_industry_constituents, industry_summary_df['板块名称'])
 
+            industry_frames = []
             for industry_name, cons_df in results:
                 if not cons_df.empty:
-                    for _, stock_row in cons_df.iterrows():
-                        stock_code_clean = str(stock_row['代码']).split('.')[0]
-                        stock_data.append({
-                            '代码': stock_code_clean,
-                            '名称': stock_row['名称'],
-                            '所属行业': industry_name
-                        })
+                    industry_frames.append(cons_df[['代码', '名称']].assign(所属行业=industry_name))
                 else:
                     print(f"    警告: 行业 '{industry_name}' 未获取到股票数据或获取失败。")
 
-        if not stock_data:
+        if not industry_frames:
             raise ValueError("未能从东方财富行业板块获取任何股票数据")
 
-        stock_df_final = pd.DataFrame(stock_data).drop_duplicates(subset=['代码'])
-        stock_data = stock_df_final.to_dict(orient='records')
-        print(f"已从AkShare (东方财富) 获取 {len(stock_data)} 只股票。")
+        # Strip exchange suffixes and de-duplicate once on the combined frame
+        stock_df_final = pd.concat(industry_frames, ignore_index=True)
+        stock_df_final['代码'] = stock_df_final['代码'].astype(str).str.split('.', n=1).str[0]
+        stock_df_final = stock_df_final.drop_duplicates(subset=['代码'])
+        universe_df = stock_df_final[UNIVERSE_COLUMNS].reset_index(drop=True)
+        print(f"已从AkShare (东方财富) 获取 {len(universe_df)} 只股票。")
         
     except Exception as e:
         print(f"从AkShare (东方财富) 获取股票池时发生错误: {e}。将尝试备用接口。")
-        stock_data = []
+        universe_df = pd.DataFrame(columns=UNIVERSE_COLUMNS)
 
         # --- 备用方案: 获取所有A股代码和名称，行业设为'未知' ---
         try:
             stock_info_df = ak.stock_info_a_code_name()
             if not stock_info_df.empty:
                 stock_info_df.rename(columns={'code': '代码', 'name': '名称'}, inplace=True)
-                for _, row in stock_info_df.iterrows():
-                    stock_code_clean = str(row['代码']).split('.')[0]
-                    stock_data.append({
-                        '代码': stock_code_clean,
-                        '名称': row['名称'],
-                        '所属行业': '未知'
-                    })
-                print(f"已从AkShare (备用接口) 获取 {len(stock_data)} 只股票。")
+                universe_df = stock_info_df.assign(
+                    代码=stock_info_df['代码'].astype(str).str.split('.').str[0],
+                    所属行业='未知',
+                )[UNIVERSE_COLUMNS]
+                print(f"已从AkShare (备用接口) 获取 {len(universe_df)} 只股票。")
         except Exception as e_fallback:
             print(f"从AkShare (备用接口) 获取股票池时发生错误: {e_fallback}。")
-            stock_data = []
+            universe_df = pd.DataFrame(columns=UNIVERSE_COLUMNS)
 
-    if not stock_data:
+    if universe_df.empty:
         print("未能从任何数据源获取到股票数据。")
-        return []
+        return universe_df
 
-    cache_data = {'date': datetime.now().isoformat(), 'data': stock_data}
-    with open(UNIVERSE_CACHE_FILE, "w", encoding="utf-8") as f:
-        json.dump(cache_data, f, ensure_ascii=False, indent=4)
+    _save_universe_cache(universe_df)
     
-    return stock_data
\ No newline at end of file
+    return universe_df
+
+def _save_universe_cache(universe_df: pd.DataFrame):
+    """
+    Writes the universe parquet cache, skipping the write when the content is unchanged.
+    A sidecar file stores the content hash; an unchanged refresh only bumps the mtime,
+    since freshness is judged from the file mtime.
+    """
+    # Columnar parquet keeps the repeated industry names dictionary-encoded
+    universe_table = pa.Table.from_pandas(universe_df[UNIVERSE_COLUMNS], preserve_index=False)
+    sink = pa.BufferOutputStream()
+    pq.write_table(universe_table, sink, compression='zstd')
+    payload = sink.getvalue().to_pybytes()
+    digest = hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    try:
+        with open(UNIVERSE_CACHE_HASH_FILE, 'r', encoding='utf-8') as f:
+            unchanged = f.read().strip() == digest and os.path.exists(UNIVERSE_CACHE_FILE)
+    except OSError:
+        unchanged = False
+    if unchanged:
+        os.utime(UNIVERSE_CACHE_FILE)
+        return
+
+    # Write to a temp file and rename, so concurrent readers never see a truncated file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(UNIVERSE_CACHE_FILE), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, UNIVERSE_CACHE_FILE)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    # The hash is only recorded once the payload it describes is in place
+    with open(UNIVERSE_CACHE_HASH_FILE, 'w', encoding='utf-8') as f:
+        f.write(digest)
\ No newline at end of file
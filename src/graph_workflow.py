@@ -6,6 +6,7 @@ This is the "brain" of the AI agent.
 """
 
 import pandas as pd
+import numpy as np
 from typing import TypedDict, List
 from langgraph.graph import StateGraph, END
 
@@ -54,6 +55,14 @@ def analyze_indicators_node(state: AgentState) -> AgentState:
         df = state.get("raw_data")
         indicators = state.get("indicators")
         df_analyzed = add_technical_indicators(df, indicators)
+
+        # Series used only by the UI chart are computed once here,
+        # so widget-triggered reruns of the page do not redo the math
+        df_analyzed['ma10'] = df_analyzed['close'].rolling(window=10).mean()
+        if 'ma20' not in df_analyzed.columns:
+            df_analyzed['ma20'] = df_analyzed['close'].rolling(window=20).mean()
+        if 'macdhist' in df_analyzed.columns:
+            df_analyzed['macdhist_color'] = np.where(df_analyzed['macdhist'] >= 0, 'green', 'red')
         return { "analyzed_data": df_analyzed }
     except Exception as e:
         return { "error": f"计算技术指标时出错: {e}" }
@@ -88,8 +97,8 @@ def generate_report_node(state: AgentState) -> AgentState:
         # Create a dynamic prompt based on whether signals were found
         if not buy_signals.empty:
             signal_summary = "\n\n量化策略信号总结：\n在以下日期触发了‘超卖反弹’买入信号：\n"
-            for index, row in buy_signals.iterrows():
-                signal_summary += f"- {row['date'].strftime('%Y-%m-%d')}\n"
+            signal_dates = buy_signals['date'].dt.strftime('%Y-%m-%d')
+            signal_summary += "".join(f"- {date_str}\n" for date_str in signal_dates)
             signal_summary += "\n请结合这些明确的量化信号进行分析。"
         else:
             signal_summary = "\n\n量化策略信号总结：\n在分析的时间范围内，未触发任何‘超卖反弹’买入信号。请基于整体技术形态进行判断。"
@@ -6,152 +6,261 @@ batch data retrieval, and batch strategy application.
 """
 
 import pandas as pd
+import numpy as np
 import time
+import heapq
 import os
-import json
+import random
+import logging
 import concurrent.futures
-from datetime import datetime, timedelta
 from typing import List, Dict
 
 # Import necessary modules from src
-from src.data_handler import get_stock_daily, get_stock_universe
+from src.data_handler import get_stock_daily, last_call_was_cached, get_stock_universe_df, get_industry_list
 from src.strategy_handler import apply_five_step_integrated_strategy
 from src.analysis_handler import calculate_strategy_indicators
 import akshare as ak
 
-# Define cache directory and file
-CACHE_DIR = "cache"
-UNIVERSE_CACHE_FILE = os.path.join(CACHE_DIR, "stock_universe_cache.json")
-CACHE_EXPIRATION_HOURS = 24 # Cache expires after 24 hours
+logger = logging.getLogger(__name__)
 
+# Upper bound (seconds) for a single retry backoff
+MAX_RETRY_DELAY = 30
 
+# Bounds for the adaptive fetch concurrency, re-evaluated every CONCURRENCY_ADJUST_EVERY completions
+MIN_FETCH_WORKERS = 4
+MAX_FETCH_WORKERS = 32
+CONCURRENCY_ADJUST_EVERY = 100
 
+# Minimum seconds between PROGRESS_* lines; the final 100% line is always printed
+PROGRESS_REPORT_INTERVAL = 0.3
 
-def _fetch_single_stock_with_retry(args):
+# Below this many stocks batch_apply_strategy runs serially instead of starting a process pool
+PROCESS_POOL_MIN_STOCKS = 200
+
+# Columns of the filter_signals result
+SIGNAL_COLUMNS = ['stock_code', 'stock_name', 'industry', 'signal_date', 'signal_type']
+
+def _fetch_single_stock(args):
     """
-    Helper function to fetch data for a single stock with retry logic.
-    To be used by a ThreadPoolExecutor.
+    Helper function to fetch data for a single stock in one attempt.
+    To be used by a ThreadPoolExecutor; retries are scheduled by batch_get_stock_daily,
+    so a failing stock never holds a worker thread while it backs off.
+
+    Returns:
+        tuple: (stock_code, DataFrame or None, exception or None, from_cache). An empty
+               result means the source has no data for the stock and is not an error;
+               from_cache is True when the data came from the disk cache without a request.
     """
-    stock_code, start_date, end_date, max_retries, initial_delay = args
-    retries = 0
-    current_delay = initial_delay
-    while retries <= max_retries:
-        try:
-            df = get_stock_daily(stock_code, start_date, end_date)
-            if df is not None and not df.empty:
-                print(f"    {stock_code} 数据获取成功。")
-                return stock_code, df
-            else:
-                # This case is treated as a failure to be retried
-                raise ValueError(f"{stock_code} 数据获取为空。")
-        except Exception as e:
-            if retries < max_retries:
-                print(f"    获取 {stock_code} 数据时发生错误: {e}。重试 ({retries + 1}/{max_retries})，等待 {current_delay} 秒...")
-                time.sleep(current_delay)
-                current_delay *= 2  # Exponential backoff
-                retries += 1
-            else:
-                print(f"    获取 {stock_code} 数据时发生错误: {e}。达到最大重试次数，放弃获取。")
-                return stock_code, None # Return None on final failure
-    return stock_code, None
+    stock_code, start_date, end_date = args
+    try:
+        df = get_stock_daily(stock_code, start_date, end_date, raise_errors=True)
+    except Exception as e:
+        return stock_code, None, e, False
+    from_cache = last_call_was_cached()
+    if df is not None and not df.empty:
+        logger.debug("%s 数据获取成功。", stock_code)
+        return stock_code, df, None, from_cache
+    logger.debug("%s 数据获取为空，跳过。", stock_code)
+    return stock_code, None, None, from_cache
 
 def batch_get_stock_daily(stock_list: List[str], start_date: str, end_date: str, max_retries: int = 3, initial_delay: int = 1, max_workers: int = 10) -> Dict[str, pd.DataFrame]:
     """
     Concurrently fetches daily data for a list of stock codes using a thread pool.
 
+    Only request errors are retried, with capped exponential backoff and full jitter.
+    A failed stock is parked in a delay queue until its retry time instead of sleeping
+    in a worker thread, so the threads keep serving other stocks meanwhile.
+
+    Concurrency starts at max_workers and adapts between MIN_FETCH_WORKERS and
+    MAX_FETCH_WORKERS: every CONCURRENCY_ADJUST_EVERY network requests it grows by 2 if
+    none needed a retry, and shrinks by 2 otherwise, to back off when the source throttles.
+    Stocks served from the disk cache do not count, so a warm cache cannot ramp it up.
+
     Args:
         stock_list (List[str]): List of stock codes.
         start_date (str): Start date in YYYYMMDD format.
         end_date (str): End date in YYYYMMDD format.
         max_retries (int): Maximum number of retries for each stock.
         initial_delay (int): Initial delay in seconds before retrying.
-        max_workers (int): The number of concurrent threads to use.
+        max_workers (int): The initial number of concurrent requests.
 
     Returns:
-        Dict[str, pd.DataFrame]: A dictionary where keys are stock codes and values are their DataFrames.
+        Dict[str, pd.DataFrame]: A dictionary where keys are stock codes and values are their DataFrames,
+                                 with the 'date' column as datetime64.
     """
     total_stocks = len(stock_list)
     if total_stocks == 0:
         print("股票列表为空，无需获取数据。")
         return {}
         
-    print(f"正在通过 {max_workers} 个线程，批量获取 {total_stocks} 只股票的历史数据...")
+    # An explicit max_workers outside the default bounds widens them instead of being clamped
+    min_workers = min(MIN_FETCH_WORKERS, max_workers)
+    max_pool_workers = max(MAX_FETCH_WORKERS, max_workers)
+    current_workers = max_workers
+    print(f"正在通过 {current_workers} 个线程 (自适应 {min_workers}-{max_pool_workers})，批量获取 {total_stocks} 只股票的历史数据...")
     all_stock_data = {}
     
-    # Prepare arguments for each task
-    tasks = [(code, start_date, end_date, max_retries, initial_delay) for code in stock_list]
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Using executor.map to maintain order and simplify result collection
-        results = executor.map(_fetch_single_stock_with_retry, tasks)
-        
+    pending_codes = iter(stock_list)
+    codes_exhausted = False
+    # Delay queue of (ready_at, seq, stock_code, retries_done, next_delay); seq breaks ties without comparing codes
+    retry_queue = []
+    retry_seq = 0
+
+    # Threads are created once at the upper bound; only the number of in-flight requests is adapted
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_pool_workers) as executor:
+        in_flight = {}  # future -> (retries_done, next_delay)
         completed_count = 0
-        for stock_code, df in results:
-            if df is not None:
-                all_stock_data[stock_code] = df
-            
-            # Update progress
-            completed_count += 1
-            progress_percent = int((completed_count / total_stocks) * 100)
-            # Make sure progress is printed on a single line and flushed
-            print(f"PROGRESS_BATCH_GET_DATA:{progress_percent}", flush=True)
-            print(f"  进度: {completed_count}/{total_stocks} ({progress_percent}%)", flush=True)
+        last_percent = -1
+        last_report_time = float('-inf')
+        window_completed = 0
+        window_retries = 0
+        while True:
+            # Top up the in-flight requests to the current concurrency limit, due retries first
+            now = time.monotonic()
+            while len(in_flight) < current_workers:
+                if retry_queue and retry_queue[0][0] <= now:
+                    _, _, stock_code, retries_done, next_delay = heapq.heappop(retry_queue)
+                elif not codes_exhausted:
+                    stock_code = next(pending_codes, None)
+                    if stock_code is None:
+                        codes_exhausted = True
+                        continue
+                    retries_done, next_delay = 0, initial_delay
+                else:
+                    break
+                future = executor.submit(_fetch_single_stock, (stock_code, start_date, end_date))
+                in_flight[future] = (retries_done, next_delay)
+
+            if not in_flight:
+                if not retry_queue:
+                    break
+                # Only parked retries are left; wait for the earliest one
+                time.sleep(max(0.0, retry_queue[0][0] - time.monotonic()))
+                continue
+
+            # Handle stocks as soon as they finish. A due retry can only be submitted into a free
+            # slot, so wake up for it only when one exists; with every slot busy, only a completion helps
+            if retry_queue and len(in_flight) < current_workers:
+                timeout = max(0.0, retry_queue[0][0] - now)
+            else:
+                timeout = None
+            done, _ = concurrent.futures.wait(in_flight, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                retries_done, next_delay = in_flight.pop(future)
+                stock_code, df, error, from_cache = future.result()
+                if error is not None:
+                    window_retries += 1
+                    if retries_done < max_retries:
+                        # Full jitter keeps failed stocks from retrying in lockstep
+                        sleep_for = random.uniform(0, min(next_delay, MAX_RETRY_DELAY))
+                        logger.debug("获取 %s 数据时发生错误: %s。重试 (%d/%d)，等待 %.1f 秒...", stock_code, error, retries_done + 1, max_retries, sleep_for)
+                        heapq.heappush(retry_queue, (time.monotonic() + sleep_for, retry_seq, stock_code,
+                                                     retries_done + 1, min(next_delay * 2, MAX_RETRY_DELAY)))
+                        retry_seq += 1
+                        continue
+                    logger.warning("获取 %s 数据时发生错误: %s。达到最大重试次数，放弃获取。", stock_code, error)
+                elif df is not None:
+                    all_stock_data[stock_code] = df
+
+                # Grow while requests succeed first time, shrink as soon as retries show up
+                if not from_cache:
+                    window_completed += 1
+                if window_completed >= CONCURRENCY_ADJUST_EVERY:
+                    if window_retries:
+                        current_workers = max(min_workers, current_workers - 2)
+                    else:
+                        current_workers = min(max_pool_workers, current_workers + 2)
+                    logger.debug("最近 %d 只股票共重试 %d 次，并发调整为 %d。", window_completed, window_retries, current_workers)
+                    window_completed = 0
+                    window_retries = 0
+                
+                # Update progress, throttled by percentage change and PROGRESS_REPORT_INTERVAL
+                completed_count += 1
+                progress_percent = int((completed_count / total_stocks) * 100)
+                now = time.monotonic()
+                if progress_percent != last_percent and (now - last_report_time >= PROGRESS_REPORT_INTERVAL or progress_percent == 100):
+                    print(f"PROGRESS_BATCH_GET_DATA:{progress_percent}", flush=True)
+                    last_percent = progress_percent
+                    last_report_time = now
+                logger.debug("进度: %d/%d (%d%%)", completed_count, total_stocks, progress_percent)
 
     print("批量数据获取完成。")
-    return all_stock_data
+    # Restore input order so downstream results do not depend on completion order
+    return {code: all_stock_data[code] for code in stock_list if code in all_stock_data}
 
 
 def _apply_strategy_to_single_stock(args):
     """
     Helper function to calculate indicators and apply strategy for a single stock.
-    To be used by a ThreadPoolExecutor.
+    Kept at module level so it can be pickled by a ProcessPoolExecutor.
     """
     stock_code, df = args
     try:
         # Step 1: Calculate indicators required by the strategy
         df_with_indicators = calculate_strategy_indicators(df)
         
-        # Step 2: Apply the actual strategy function
-        df_with_signals = apply_five_step_integrated_strategy(df_with_indicators)
+        # Step 2: Apply the actual strategy function; screening only needs date + signal,
+        # which also keeps the frames sent back from the worker processes small
+        df_with_signals = apply_five_step_integrated_strategy(df_with_indicators, return_slim=True)
         return stock_code, df_with_signals
     except Exception as e:
-        print(f"    对 {stock_code} 应用策略时发生错误: {e}")
+        logger.warning("对 %s 应用策略时发生错误: %s", stock_code, e)
         return stock_code, None
 
-def batch_apply_strategy(data_dict: Dict[str, pd.DataFrame], max_workers: int = 10) -> Dict[str, pd.DataFrame]:
+def _collect_strategy_results(results, total_stocks: int) -> Dict[str, pd.DataFrame]:
+    """Gathers (stock_code, signals) results in order while reporting throttled progress."""
+    processed_data = {}
+    completed_count = 0
+    last_percent = -1
+    last_report_time = float('-inf')
+    for stock_code, df_with_signals in results:
+        if df_with_signals is not None:
+            processed_data[stock_code] = df_with_signals
+        
+        completed_count += 1
+        progress_percent = int((completed_count / total_stocks) * 100)
+        now = time.monotonic()
+        if progress_percent != last_percent and (now - last_report_time >= PROGRESS_REPORT_INTERVAL or progress_percent == 100):
+            print(f"PROGRESS_BATCH_APPLY_STRATEGY:{progress_percent}", flush=True)
+            last_percent = progress_percent
+            last_report_time = now
+        logger.debug("进度: %d/%d (%d%%)", completed_count, total_stocks, progress_percent)
+    return processed_data
+
+def batch_apply_strategy(data_dict: Dict[str, pd.DataFrame], max_workers: int = None) -> Dict[str, pd.DataFrame]:
     """
-    Applies the five-step integrated strategy to each stock's DataFrame in the dictionary
-    using multithreading.
+    Applies the five-step integrated strategy to each stock's DataFrame in the dictionary.
+    The computation is CPU-bound, so large batches go through a process pool that is
+    created for this call and shut down when it returns. Batches smaller than
+    PROCESS_POOL_MIN_STOCKS run serially, since starting the workers (which re-import
+    akshare, talib and numba under spawn) would cost more than it saves.
 
     Args:
         data_dict (Dict[str, pd.DataFrame]): Dictionary of stock codes to their raw DataFrames.
-        max_workers (int): The number of concurrent threads to use.
+        max_workers (int): The number of worker processes to use. Defaults to os.cpu_count().
 
     Returns:
-        Dict[str, pd.DataFrame]: Dictionary with strategy applied and 'signal' column added.
+        Dict[str, pd.DataFrame]: Dictionary of stock codes to slim DataFrames with 'date' and 'signal' columns.
     """
     total_stocks = len(data_dict)
     if total_stocks == 0:
         print("股票数据为空，无需应用策略。")
         return {}
 
-    print(f"正在通过 {max_workers} 个线程，批量应用策略到 {total_stocks} 只股票...")
-    processed_data = {}
-    
     tasks = [(code, df) for code, df in data_dict.items()]
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        results = executor.map(_apply_strategy_to_single_stock, tasks)
-        
-        completed_count = 0
-        for stock_code, df_with_signals in results:
-            if df_with_signals is not None:
-                processed_data[stock_code] = df_with_signals
-            
-            completed_count += 1
-            progress_percent = int((completed_count / total_stocks) * 100)
-            print(f"PROGRESS_BATCH_APPLY_STRATEGY:{progress_percent}", flush=True)
-            print(f"  进度: {completed_count}/{total_stocks} ({progress_percent}%)", flush=True)
+    if total_stocks < PROCESS_POOL_MIN_STOCKS:
+        print(f"正在当前进程中批量应用策略到 {total_stocks} 只股票...")
+        processed_data = _collect_strategy_results(map(_apply_strategy_to_single_stock, tasks), total_stocks)
+    else:
+        max_workers = max_workers or os.cpu_count() or 1
+        # Send several stocks per IPC round trip to amortize the pickling overhead
+        chunksize = max(1, total_stocks // (max_workers * 4))
+
+        print(f"正在通过 {max_workers} 个进程，批量应用策略到 {total_stocks} 只股票...")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(_apply_strategy_to_single_stock, tasks, chunksize=chunksize)
+            processed_data = _collect_strategy_results(results, total_stocks)
 
     print("批量策略应用完成。")
     return processed_data
@@ -172,75 +281,80 @@ def _prepare_detailed_signals_for_display(df_with_signals: pd.DataFrame, recent_
     if df_with_signals.empty or 'signal' not in df_with_signals.columns or 'date' not in df_with_signals.columns:
         return pd.DataFrame()
 
-    # Ensure 'date' is datetime and sort
+    # Ensure 'date' is datetime
     df_with_signals['date'] = pd.to_datetime(df_with_signals['date'])
-    df_with_signals = df_with_signals.sort_values(by='date', ascending=False)
 
     # Get the most recent 'recent_days' dates
     latest_date = df_with_signals['date'].max()
     start_date_window = latest_date - pd.Timedelta(days=recent_days - 1) # -1 because latest_date is included
 
-    df_window = df_with_signals[df_with_signals['date'] >= start_date_window].copy()
+    df_window = df_with_signals[df_with_signals['date'] >= start_date_window]
     
-    # Create a date range for all recent days, even if no data exists for some
+    # Create a chronological date range for all recent days, even if no data exists for some
     all_dates_in_window = pd.date_range(start=start_date_window, end=latest_date, freq='D')
-    all_dates_in_window_str = [d.strftime('%Y-%m-%d') for d in all_dates_in_window]
-
-    # Initialize display DataFrame
-    display_df = pd.DataFrame(index=['买入信号', '卖出信号'], columns=all_dates_in_window_str)
-    display_df = display_df.fillna('—') # Fill with no signal marker
-
-    for _, row in df_window.iterrows():
-        date_str = row['date'].strftime('%Y-%m-%d')
-        if row['signal'] == 1:
-            display_df.loc['买入信号', date_str] = '✅'
-        elif row['signal'] == -1:
-            display_df.loc['卖出信号', date_str] = '✅'
-            
-    # Ensure columns are sorted chronologically
-    display_df = display_df[sorted(display_df.columns)]
+    all_dates_in_window_str = all_dates_in_window.strftime('%Y-%m-%d')
+
+    # Mark each calendar day by membership in the buy/sell date sets instead of per-row assignment
+    window_dates_str = df_window['date'].dt.strftime('%Y-%m-%d')
+    window_signals = df_window['signal'].to_numpy()
+    buy_marks = np.where(all_dates_in_window_str.isin(window_dates_str[window_signals == 1]), '✅', '—')
+    sell_marks = np.where(all_dates_in_window_str.isin(window_dates_str[window_signals == -1]), '✅', '—')
+    display_df = pd.DataFrame([buy_marks, sell_marks], index=['买入信号', '卖出信号'], columns=all_dates_in_window_str)
 
     return display_df
 
 
-def filter_signals(data_dict: Dict[str, pd.DataFrame], stock_names_map: Dict[str, str], stock_industry_map: Dict[str, str], signal_type: str = 'buy', recent_days: int = 5) -> List[Dict]:
+def filter_signals(data_dict: Dict[str, pd.DataFrame], stock_names_map: Dict[str, str], stock_industry_map: Dict[str, str], signal_type: str = 'buy', recent_days: int = 5) -> pd.DataFrame:
     """
     Filters stocks based on generated signals within recent days, including stock name and industry.
 
     Args:
-        data_dict (Dict[str, pd.DataFrame]): Dictionary of stock codes to their DataFrames with signals.
+        data_dict (Dict[str, pd.DataFrame]): Dictionary of stock codes to their DataFrames with signals
+                                             and a datetime64 'date' column.
         stock_names_map (Dict[str, str]): Map from stock code to stock name.
         stock_industry_map (Dict[str, str]): Map from stock code to stock industry.
         signal_type (str): Type of signal to filter ('buy' or 'sell').
         recent_days (int): Look back for signals within this many recent days.
 
     Returns:
-        List[Dict]: A list of dictionaries, each containing 'stock_code', 'stock_name', 'industry', 'signal_date', 'signal_type'.
+        pd.DataFrame: One row per signal with the SIGNAL_COLUMNS columns
+                      ('stock_code', 'stock_name', 'industry', 'signal_date', 'signal_type').
+                      Empty (with the same columns) when nothing is found.
     """
     print(f"正在筛选最近 {recent_days} 天内的 {signal_type} 信号...")
-    found_signals = []
     target_signal = 1 if signal_type == 'buy' else -1
+    lookback = np.timedelta64(recent_days, 'D')
 
+    frames = []
     for stock_code, df in data_dict.items():
         if not df.empty and 'signal' in df.columns:
-            # Ensure 'date' column is datetime for comparison
-            if not pd.api.types.is_datetime64_any_dtype(df['date']):
-                df['date'] = pd.to_datetime(df['date'], format='%Y%m%d')
-            
-            # Filter for recent signals
-            recent_df = df[df['date'] >= (pd.to_datetime(df['date'].max()) - pd.Timedelta(days=recent_days))]
-            
-            signals_in_recent_days = recent_df[recent_df['signal'] == target_signal]
-            
-            if not signals_in_recent_days.empty:
-                for _, row in signals_in_recent_days.iterrows():
-                    found_signals.append({
-                        'stock_code': stock_code,
-                        'stock_name': stock_names_map.get(stock_code, '未知名称'),
-                        'industry': stock_industry_map.get(stock_code, '未知行业'),
-                        'signal_date': row['date'].strftime('%Y-%m-%d'),
-                        'signal_type': signal_type
-                    })
+            # 'date' is already datetime64 (normalized at fetch time). Dates are unique and sorted,
+            # so at most recent_days + 1 trailing bars can fall in the window
+            tail_len = min(len(df), recent_days + 1)
+            # Most stocks have no target signal in the tail; skip them before building any frame
+            if not (df['signal'].to_numpy()[-tail_len:] == target_signal).any():
+                continue
+            tail_dates = df['date'].to_numpy()[-tail_len:]
+            # Sorted dates: the window start is a binary search away from the latest bar
+            window_start = np.searchsorted(tail_dates, tail_dates[-1] - lookback, side='left')
+            window = df.iloc[len(df) - tail_len + window_start:]
+            frames.append(window[['date', 'signal']].assign(stock_code=stock_code))
+
+    found_signals = pd.DataFrame(columns=SIGNAL_COLUMNS)
+    if frames:
+        # Every row is already inside its stock's window; filter all stocks at once on the signal
+        all_df = pd.concat(frames, ignore_index=True)
+        # Plain numpy comparison + positional take avoid building and aligning boolean Series
+        hit_idx = np.flatnonzero(all_df['signal'].to_numpy() == target_signal)
+        hits = all_df.take(hit_idx)
+        found_signals = pd.DataFrame({
+            'stock_code': hits['stock_code'],
+            'stock_name': hits['stock_code'].map(stock_names_map).fillna('未知名称'),
+            'industry': hits['stock_code'].map(stock_industry_map).fillna('未知行业'),
+            'signal_date': hits['date'].dt.strftime('%Y-%m-%d'),
+            'signal_type': signal_type
+        }, columns=SIGNAL_COLUMNS).reset_index(drop=True)
+
     print(f"筛选完成，共找到 {len(found_signals)} 个符合条件的信号。")
     return found_signals
 
@@ -251,13 +365,14 @@ if __name__ == '__main__':
     test_end_date = "20240919"
 
     # 1. Get stock universe
-    universe_data = get_stock_universe() # This now returns List[Dict]
-    stock_names_map = {item['代码']: item['名称'] for item in universe_data}
-    stock_industry_map = {item['代码']: item.get('所属行业', '未知') for item in universe_data}
+    universe_df = get_stock_universe_df()
+    indexed_universe = universe_df.set_index('代码')
+    stock_names_map = indexed_universe['名称'].to_dict()
+    stock_industry_map = indexed_universe['所属行业'].fillna('未知').to_dict()
 
     # 2. Batch get data
     # Need to pass just stock codes to batch_get_stock_daily
-    stock_codes = [item['代码'] for item in universe_data]
+    stock_codes = universe_df['代码'].tolist()
     all_data = batch_get_stock_daily(stock_codes, test_start_date, test_end_date)
 
     # 3. Batch apply strategy
@@ -271,6 +386,6 @@ if __name__ == '__main__':
     print("买入信号:", buy_signals)
     print("卖出信号:", sell_signals)
 
-    if not buy_signals and not sell_signals:
+    if buy_signals.empty and sell_signals.empty:
         print("未找到任何买入或卖出信号。")
     print("\n--- screening_handler 模块测试结束 ---")
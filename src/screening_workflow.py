@@ -10,7 +10,8 @@ from langgraph.graph import StateGraph, END
 
 # Import functions from screening_handler
 from src.screening_handler import (
-    get_stock_universe,
+    get_stock_universe_df,
+    get_industry_list,
     batch_get_stock_daily,
     batch_apply_strategy,
     filter_signals
@@ -31,7 +32,7 @@ class ScreeningState(TypedDict):
     processed_stock_data: Dict[str, pd.DataFrame] # Data after strategy applied
     signal_type: str # 'buy' or 'sell'
     recent_days: int # Look back for signals
-    found_signals: List[Dict] # List of dictionaries with found signals
+    found_signals: pd.DataFrame # One row per found signal (see SIGNAL_COLUMNS)
     error: str
 
 # --- 2. Define the Nodes ---
@@ -41,39 +42,37 @@ def get_universe_node(state: ScreeningState) -> ScreeningState:
     print("-- 选股工作流: 1. 获取并筛选股票池 --")
     try:
         # Step 1: Fetch the full universe
-        full_universe_data = get_stock_universe()
-        if not full_universe_data:
+        full_universe_df = get_stock_universe_df()
+        if full_universe_df.empty:
             return { "error": "未能获取股票池。" }
 
         # Step 2: Filter the universe based on selection
         selected_industries = state.get("selected_industries")
         
         # Create a full list of all industries to check if the user selected all
-        all_industries = sorted(list(set([item.get('所属行业', '未知') for item in full_universe_data])))
+        all_industries = get_industry_list()
 
         # Filter only if a specific subset of industries is selected
         if selected_industries and set(selected_industries) != set(all_industries):
             print(f"根据选择的行业进行筛选: {selected_industries}")
-            filtered_universe = [
-                stock for stock in full_universe_data 
-                if stock.get('所属行业') in selected_industries
-            ]
+            filtered_df = full_universe_df[full_universe_df['所属行业'].isin(selected_industries)]
         else:
             print("未指定特定行业或选择了所有行业，将使用完整股票池。")
-            filtered_universe = full_universe_data
+            filtered_df = full_universe_df
         
-        if not filtered_universe:
+        if filtered_df.empty:
              return { "error": f"在所选行业 {selected_industries} 中未找到任何股票。" }
 
-        print(f"筛选后剩余 {len(filtered_universe)} 只股票。")
+        print(f"筛选后剩余 {len(filtered_df)} 只股票。")
 
         # Step 3: Create mappings from the filtered universe
-        stock_codes = [item['代码'] for item in filtered_universe]
-        stock_names_map = {item['代码']: item['名称'] for item in filtered_universe}
-        stock_industry_map = {item['代码']: item.get('所属行业', '未知') for item in filtered_universe}
+        indexed_universe = filtered_df.set_index('代码')
+        stock_codes = filtered_df['代码'].tolist()
+        stock_names_map = indexed_universe['名称'].to_dict()
+        stock_industry_map = indexed_universe['所属行业'].fillna('未知').to_dict()
         
         return { 
-            "stock_universe": filtered_universe, # Store the filtered data
+            "stock_universe": filtered_df.to_dict(orient='records'), # Store the filtered data
             "stock_codes": stock_codes,
             "stock_names_map": stock_names_map,
             "stock_industry_map": stock_industry_map
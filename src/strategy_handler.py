@@ -8,6 +8,29 @@ with a 'signal' column.
 
 import pandas as pd
 import numpy as np
+import bottleneck as bn
+from numba import njit
+import logging
+
+logger = logging.getLogger(__name__)
+
+@njit(cache=True)
+def _oversold_reversal_signal_kernel(close, rsi, bbands_lower, k, d):
+    """
+    Computes the oversold reversal signal in a single compiled loop over float64 arrays.
+    NaN comparisons evaluate to False, so the explicit notna() checks are implied.
+    """
+    n = close.shape[0]
+    signal = np.zeros(n, dtype=np.int8)
+    for i in range(1, n):
+        # Conditions based on the provided strategy document:
+        # RSI oversold, price at/below the lower Bollinger Band,
+        # and K crossing above D while both are in the oversold area
+        if (rsi[i] < 25 and close[i] <= bbands_lower[i] and
+                k[i] < 20 and d[i] < 20 and
+                k[i] > d[i] and k[i - 1] < d[i - 1]):
+            signal[i] = 1
+    return signal
 
 def apply_oversold_reversal_strategy(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -22,30 +45,20 @@ def apply_oversold_reversal_strategy(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: The original DataFrame with an added 'signal' column.
                       Signal: 1 for buy, 0 for hold/no signal.
     """
-    print("  - 应用“超卖反弹组合”策略...")
+    logger.debug("应用“超卖反弹组合”策略...")
     df_strat = df.copy()
     
-    # Define the conditions based on the provided strategy document
-    # Condition 1: RSI is in oversold territory
-    cond_rsi = df_strat['rsi'] < 25
-    
-    # Condition 2: Price touches or goes below the lower Bollinger Band
-    # Ensure bbands_lower exists and is not NaN
-    cond_bbands = (df_strat['bbands_lower'].notna()) & (df_strat['close'] <= df_strat['bbands_lower'])
-    
-    # Condition 3: Stochastic K line crosses above D line in the oversold area
-    # Ensure k and d exist and are not NaN
-    cond_kd_oversold = (df_strat['k'].notna()) & (df_strat['d'].notna()) & (df_strat['k'] < 20) & (df_strat['d'] < 20)
-    cond_kd_cross = (df_strat['k'] > df_strat['d']) & (df_strat['k'].shift(1) < df_strat['d'].shift(1))
+    # Create the signal column; int8 is enough for {0, 1} and keeps later scans small
+    df_strat['signal'] = _oversold_reversal_signal_kernel(
+        df_strat['close'].to_numpy(dtype=np.float64),
+        df_strat['rsi'].to_numpy(dtype=np.float64),
+        df_strat['bbands_lower'].to_numpy(dtype=np.float64),
+        df_strat['k'].to_numpy(dtype=np.float64),
+        df_strat['d'].to_numpy(dtype=np.float64),
+    )
     
-    # Combine all conditions
-    buy_conditions = cond_rsi & cond_bbands & cond_kd_oversold & cond_kd_cross
-    
-    # Create the signal column
-    df_strat['signal'] = np.where(buy_conditions, 1, 0)
-    
-    signal_points = df_strat[df_strat['signal'] == 1]
-    print(f"  - 策略完成，共找到 {len(signal_points)} 个潜在买入信号点。")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("策略完成，共找到 %d 个潜在买入信号点。", int((df_strat['signal'] == 1).sum()))
     
     return df_strat
 
@@ -54,7 +67,28 @@ def apply_oversold_reversal_strategy(df: pd.DataFrame) -> pd.DataFrame:
 #     ...
 #     return df
 
-def apply_five_step_integrated_strategy(df: pd.DataFrame) -> pd.DataFrame:
+@njit(cache=True)
+def _five_step_signal_kernel(close, ma20, macdhist, rsi, volume, avg_volume_20):
+    """
+    Computes the five-step signal in a single compiled loop over float64 arrays.
+    NaN comparisons evaluate to False, matching the pandas implementation.
+    """
+    n = close.shape[0]
+    signal = np.zeros(n, dtype=np.int8)  # Default to hold
+    for i in range(1, n):
+        # Sell: MACD death cross (histogram turns from positive to negative); sell wins ties
+        if macdhist[i] < 0 and macdhist[i - 1] >= 0:
+            signal[i] = -1
+        # Technical trigger: MACD golden cross, RSI rising out of oversold, price above MA20,
+        # validated by volume at least 1.5x the 20-day average
+        elif (macdhist[i] > 0 and macdhist[i - 1] <= 0 and
+                rsi[i] > 30 and rsi[i - 1] <= 30 and
+                close[i] > ma20[i] and
+                volume[i] > avg_volume_20[i] * 1.5):
+            signal[i] = 1
+    return signal
+
+def apply_five_step_integrated_strategy(df: pd.DataFrame, return_slim: bool = False) -> pd.DataFrame:
     """
     Applies the "Five-Step Integrated Trading Strategy".
 
@@ -65,54 +99,44 @@ def apply_five_step_integrated_strategy(df: pd.DataFrame) -> pd.DataFrame:
         df (pd.DataFrame): DataFrame with pre-calculated technical indicators.
                            Requires: 'close', 'ma20', 'ma200', 'macdhist', 'rsi',
                                      'volume'.
+        return_slim (bool): If True, skip copying the input and return only the
+                            'date' and 'signal' columns (used by batch screening).
 
     Returns:
         pd.DataFrame: The original DataFrame with an added 'signal' column.
                       Signal: 1 for buy, -1 for sell, 0 for hold.
     """
-    print("  - 应用“五步集成交易”策略...")
-    df_strat = df.copy()
-
-    # --- Buy Signal Conditions ---
+    logger.debug("应用“五步集成交易”策略...")
 
     # 1. Macro Trend Condition (optional, can be checked externally)
     # For this function, we assume the stock is already in a valid macro trend
-    # e.g., df_strat['close'] > df_strat['ma200']
-
-    # 2. Technical Trigger Conditions
-    # Condition 2a: MACD golden cross (histogram turns from negative to positive)
-    cond_macd_cross = (df_strat['macdhist'] > 0) & (df_strat['macdhist'].shift(1) <= 0)
-
-    # Condition 2b: RSI rises from the oversold area
-    cond_rsi_rise = (df_strat['rsi'] > 30) & (df_strat['rsi'].shift(1) <= 30)
-    
-    # Condition 2c: Price is above the 20-day moving average
-    cond_ma20 = df_strat['close'] > df_strat['ma20']
-
-    # Combine technical trigger conditions
-    cond_tech_trigger = cond_macd_cross & cond_rsi_rise & cond_ma20
+    # e.g., df['close'] > df['ma200']
 
-    # 3. Volume Validation Condition
-    # Calculate 20-day average volume
-    avg_volume_20 = df_strat['volume'].rolling(window=20).mean()
-    # Condition 3a: Volume is 1.5x greater than the 20-day average
-    cond_volume = df_strat['volume'] > (avg_volume_20 * 1.5)
-
-    # Final Buy Condition
-    buy_conditions = cond_tech_trigger & cond_volume
-
-    # --- Sell Signal Conditions ---
-
-    # Condition: MACD death cross (histogram turns from positive to negative)
-    sell_conditions = (df_strat['macdhist'] < 0) & (df_strat['macdhist'].shift(1) >= 0)
+    # 3. Volume Validation uses the 20-day average volume (NaN until a full window exists)
+    volume = df['volume'].to_numpy(dtype=np.float64)
+    # bn.move_mean rejects windows longer than the input, so short frames get an all-NaN average
+    if len(volume) < 20:
+        avg_volume_20 = np.full_like(volume, np.nan)
+    else:
+        avg_volume_20 = bn.move_mean(volume, window=20, min_count=20)
 
     # --- Generate Signals ---
-    df_strat['signal'] = 0  # Default to hold
-    df_strat.loc[buy_conditions, 'signal'] = 1
-    df_strat.loc[sell_conditions, 'signal'] = -1
+    signal = _five_step_signal_kernel(
+        df['close'].to_numpy(dtype=np.float64),
+        df['ma20'].to_numpy(dtype=np.float64),
+        df['macdhist'].to_numpy(dtype=np.float64),
+        df['rsi'].to_numpy(dtype=np.float64),
+        volume,
+        avg_volume_20,
+    )
     
-    buy_points = df_strat[df_strat['signal'] == 1]
-    sell_points = df_strat[df_strat['signal'] == -1]
-    print(f"  - 策略完成，共找到 {len(buy_points)} 个买入信号和 {len(sell_points)} 个卖出信号。")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("策略完成，共找到 %d 个买入信号和 %d 个卖出信号。",
+                     int((signal == 1).sum()), int((signal == -1).sum()))
 
+    if return_slim:
+        return pd.DataFrame({'date': df['date'].to_numpy(), 'signal': signal})
+
+    df_strat = df.copy()
+    df_strat['signal'] = signal
     return df_strat
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared chart and table helpers for the Streamlit pages.
+"""
+
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# --- Column Name Translation Map ---
+COLUMN_MAP = {
+    'date': '日期', 'open': '开盘', 'close': '收盘', 'high': '最高', 'low': '最低',
+    'volume': '成交量', 'amount': '成交额', 'amplitude': '振幅', 'pct_chg': '涨跌幅',
+    'change': '涨跌额', 'turnover': '换手率', 'rsi': 'RSI', 'macd': 'MACD',
+    'macdsignal': 'Signal', 'macdhist': 'Hist', 'ma10': 'MA10', 'ma20': 'MA20', 'k': 'K', 'd': 'D',
+    'obv': 'OBV', 'bbands_upper': '布林上轨', 'bbands_middle': '布林中轨', 'bbands_lower': '布林下轨',
+    'signal': '策略信号'
+}
+
+# Define highlight function for dataframe
+def highlight_signals(s):
+    return ['background-color: #90EE90' if v == 1 else '' for v in s]
+
+def create_candlestick_chart(df: pd.DataFrame):
+    """
+    Creates an interactive Candlestick chart with MAs and MACD using Plotly.
+    Expects 'ma10', 'ma20' and 'macdhist_color' to be precomputed by the analysis workflow.
+    """
+    if df.empty:
+        return go.Figure()
+
+    # Coerce dates once so every trace shares the same datetime64 buffer
+    x = pd.to_datetime(df['date'], cache=True).to_numpy()
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, 
+                        vertical_spacing=0.05, subplot_titles=('K线与移动平均线', 'MACD'), 
+                        row_heights=[0.7, 0.3])
+
+    # Build each subplot's traces up front and attach them in one call per row
+    traces_top = [
+        go.Candlestick(x=x, open=df['open'], high=df['high'], low=df['low'], close=df['close'], name="K线"),
+        go.Scatter(x=x, y=df['ma10'], mode='lines', name='MA10', line=dict(color='orange', width=1)),
+        go.Scatter(x=x, y=df['ma20'], mode='lines', name='MA20', line=dict(color='purple', width=1)),
+    ]
+    traces_bottom = [
+        go.Bar(x=x, y=df['macdhist'], name='MACD Hist', marker_color=df['macdhist_color']),
+        go.Scatter(x=x, y=df['macd'], mode='lines', name='MACD'),
+        go.Scatter(x=x, y=df['macdsignal'], mode='lines', name='Signal'),
+    ]
+    fig.add_traces(traces_top, rows=[1] * len(traces_top), cols=[1] * len(traces_top))
+    fig.add_traces(traces_bottom, rows=[2] * len(traces_bottom), cols=[1] * len(traces_bottom))
+
+    fig.update_layout(title_text='股价走势与技术指标', xaxis_rangeslider_visible=False, height=600, legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+    fig.update_yaxes(title_text="价格", row=1, col=1)
+    fig.update_yaxes(title_text="MACD", row=2, col=1)
+
+    return fig
@@ -15,20 +15,27 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.analysis_handler import add_technical_indicators, get_available_indicators
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_stock_data():
-    """Creates a sample DataFrame with stock data for testing."""
+    """
+    Creates a sample DataFrame with stock data for testing.
+    Built once per module; add_technical_indicators works on a copy, so tests do not mutate it.
+    """
+    # A fixed seed keeps the sample data, and therefore any failure, reproducible
+    rng = np.random.default_rng(42)
+    # One draw for open/high/low, with per-column bounds broadcast across the rows
+    open_high_low = rng.uniform(low=[98, 100, 95], high=[102, 105, 100], size=(50, 3))
     data = {
         'date': pd.to_datetime(pd.date_range(start='2024-01-01', periods=50)),
-        'open': np.random.uniform(98, 102, 50),
-        'high': np.random.uniform(100, 105, 50),
-        'low': np.random.uniform(95, 100, 50),
+        'open': open_high_low[:, 0],
+        'high': open_high_low[:, 1],
+        'low': open_high_low[:, 2],
         'close': np.linspace(100, 150, 50),
-        'volume': np.random.randint(100000, 500000, 50).astype(float) # Volume needs to be float for talib
+        'volume': rng.integers(100000, 500000, 50).astype(float) # Volume needs to be float for talib
     }
     df = pd.DataFrame(data)
-    df['high'] = df[['high', 'close']].max(axis=1)
-    df['low'] = df[['low', 'close']].min(axis=1)
+    df['high'] = np.maximum(df['high'].to_numpy(), df['close'].to_numpy())
+    df['low'] = np.minimum(df['low'].to_numpy(), df['close'].to_numpy())
     return df
 
 def test_get_available_indicators():
@@ -56,12 +63,31 @@ def test_add_all_technical_indicators(sample_stock_data):
     assert 'bbands_upper' in df_analyzed.columns
     
     # Check that the new columns are not all empty (NaN)
-    assert not pd.isna(df_analyzed['rsi'].iloc[-1])
-    assert not pd.isna(df_analyzed['macd'].iloc[-1])
-    assert not pd.isna(df_analyzed['ma20'].iloc[-1])
-    assert not pd.isna(df_analyzed['k'].iloc[-1])
-    assert not pd.isna(df_analyzed['obv'].iloc[-1])
-    assert not pd.isna(df_analyzed['bbands_upper'].iloc[-1])
+    last_row = df_analyzed[['rsi', 'macd', 'ma20', 'k', 'obv', 'bbands_upper']].iloc[-1]
+    assert not last_row.isna().any(), f"Unexpected NaN in: {last_row[last_row.isna()].index.tolist()}"
+
+# Columns each registered indicator is expected to add (MA uses its default period of 20)
+EXPECTED_INDICATOR_COLUMNS = {
+    'rsi': ['rsi'],
+    'macd': ['macd', 'macdsignal', 'macdhist'],
+    'ma': ['ma20'],
+    'kd': ['k', 'd'],
+    'obv': ['obv'],
+    'bbands': ['bbands_upper', 'bbands_middle', 'bbands_lower'],
+}
+
+@pytest.mark.parametrize('indicators', [
+    ['rsi', 'macd'],
+    ['rsi', 'bbands'],
+    get_available_indicators(),
+])
+def test_add_indicator_subsets(sample_stock_data, indicators):
+    """Tests that each indicator subset adds exactly its own columns."""
+    df_analyzed = add_technical_indicators(sample_stock_data, indicators)
+
+    expected = {col for name in indicators for col in EXPECTED_INDICATOR_COLUMNS[name]}
+    added = set(df_analyzed.columns) - set(sample_stock_data.columns)
+    assert added == expected
 
 def test_add_technical_indicators_gracefully_handles_invalid(sample_stock_data):
     """Tests that the function handles unknown indicators gracefully."""
@@ -4,6 +4,10 @@
 Unit tests for the data_handler module.
 """
 
+import struct
+import time
+import concurrent.futures
+from datetime import datetime
 import pandas as pd
 import pytest
 
@@ -12,13 +16,32 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.data_handler import get_stock_daily
+import src.data_handler as data_handler
+from src.data_handler import get_stock_daily, disk_memoize, _read_tdx_day_file
 
+# Ping An Bank is unlikely to be delisted; 999999 is syntactically valid but does not exist
+NETWORK_TEST_CODES = ["000001", "999999"]
 
-def test_get_stock_daily_valid_code():
+
+def fetch_many(codes, start_date, end_date, max_workers=8):
+    """Fetches several stocks concurrently; the requests are network-bound."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = executor.map(lambda code: get_stock_daily(code, start_date, end_date), codes)
+        return dict(zip(codes, frames))
+
+@pytest.fixture(scope="module")
+def daily_data_by_code(tmp_path_factory):
+    """
+    Fetches all network test codes once, in parallel, for the tests in this module.
+    The disk cache is redirected so the tests hit the network and leave the checkout clean.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(data_handler, "DAILY_CACHE_DIR", str(tmp_path_factory.mktemp("daily")))
+        return fetch_many(NETWORK_TEST_CODES, "20240101", "20240110")
+
+def test_get_stock_daily_valid_code(daily_data_by_code):
     """Tests if get_stock_daily returns a DataFrame for a valid stock code."""
-    # Use a well-known stock code that is unlikely to be delisted, like Ping An Bank
-    df = get_stock_daily(stock_code="000001", start_date="20240101", end_date="20240110")
+    df = daily_data_by_code["000001"]
     
     # Assert that the result is a pandas DataFrame
     assert isinstance(df, pd.DataFrame)
@@ -30,13 +53,80 @@ def test_get_stock_daily_valid_code():
     expected_columns = ['date', 'open', 'high', 'low', 'close', 'volume']
     assert all(col in df.columns for col in expected_columns)
 
-def test_get_stock_daily_invalid_code():
+def test_get_stock_daily_invalid_code(daily_data_by_code):
     """Tests if get_stock_daily returns an empty DataFrame for an invalid stock code."""
-    # Use a stock code that is syntactically valid but does not exist
-    df = get_stock_daily(stock_code="999999", start_date="20240101", end_date="20240110")
+    df = daily_data_by_code["999999"]
     
     # Assert that the result is a pandas DataFrame
     assert isinstance(df, pd.DataFrame)
     
     # Assert that the DataFrame is empty
     assert df.empty
+
+
+def test_disk_memoize_caches_and_slices(tmp_path):
+    """Tests that cached frames are reused, sliced for narrower ranges, and empties are not cached."""
+    calls = []
+
+    @disk_memoize(cache_dir=str(tmp_path))
+    def fake_fetch(stock_code, start_date, end_date):
+        calls.append((stock_code, start_date, end_date))
+        if stock_code == "999999":
+            return pd.DataFrame()
+        dates = pd.date_range(start=pd.to_datetime(start_date), end=pd.to_datetime(end_date))
+        return pd.DataFrame({'date': dates, 'close': range(len(dates))})
+
+    df_full = fake_fetch("000001", "20240101", "20240110")
+    assert not data_handler.last_call_was_cached()
+    df_again = fake_fetch("000001", "20240101", "20240110")
+    assert data_handler.last_call_was_cached()
+    df_slice = fake_fetch("000001", "20240103", "20240105")
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(df_full, df_again)
+    assert df_slice['date'].tolist() == list(pd.date_range("2024-01-03", "2024-01-05"))
+
+    # Empty results must be fetched again rather than served from cache
+    fake_fetch("999999", "20240101", "20240110")
+    fake_fetch("999999", "20240101", "20240110")
+    assert len(calls) == 3
+
+
+def test_disk_memoize_prunes_and_expires_recent(tmp_path):
+    """Tests that covered files are pruned and ranges ending today are only cached briefly."""
+    calls = []
+
+    @disk_memoize(cache_dir=str(tmp_path))
+    def fake_fetch(stock_code, start_date, end_date):
+        calls.append((stock_code, start_date, end_date))
+        return pd.DataFrame({'date': [pd.Timestamp(start_date)], 'close': [1.0]})
+
+    fake_fetch("000001", "20240103", "20240105")
+    fake_fetch("000001", "20240101", "20240110")
+    assert [p.name for p in tmp_path.glob("*.parquet")] == ["000001_20240101_20240110.parquet"]
+
+    today = datetime.now().strftime("%Y%m%d")
+    fake_fetch("000001", "20240101", today)
+    fake_fetch("000001", "20240101", today)
+    assert len(calls) == 3
+
+    # Once older than the short TTL, a range ending today is fetched again
+    stale = time.time() - (data_handler.RECENT_CACHE_TTL_MINUTES + 1) * 60
+    os.utime(tmp_path / f"000001_20240101_{today}.parquet", (stale, stale))
+    fake_fetch("000001", "20240101", today)
+    assert len(calls) == 4
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_read_tdx_day_file(tmp_path):
+    """Tests that .day records are decoded and a trailing partial record is ignored."""
+    path = tmp_path / "sz000001.day"
+    records = [struct.pack('<IIIIIfII', 20240102 + i, 1000 + i, 1100, 900, 1050, 2048.0, 300 * i, 0) for i in range(3)]
+    path.write_bytes(b''.join(records) + b'\x00' * 10)
+
+    df = _read_tdx_day_file(str(path))
+
+    assert list(df.columns) == ['date', 'open', 'high', 'low', 'close', 'volume', 'amount']
+    assert len(df) == 3
+    assert df['date'].iloc[0] == pd.Timestamp('2024-01-02')
+    assert df['open'].tolist() == [10.0, 10.01, 10.02]
+    assert df['volume'].tolist() == [0, 300, 600]
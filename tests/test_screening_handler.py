@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the screening_handler module.
+"""
+
+import time
+import logging
+import concurrent.futures
+import pandas as pd
+import numpy as np
+import pytest
+
+# Add src to the path to allow direct import of our modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.screening_handler as screening_handler
+from src.screening_handler import filter_signals, batch_apply_strategy, batch_get_stock_daily
+
+@pytest.fixture
+def mock_signal_data():
+    """Creates mock per-stock DataFrames with precomputed signals."""
+    dates = pd.date_range(start='2024-01-01', periods=10)
+    return {
+        # Buy signals on day 2 (too old) and day 9 (recent), sell signal on day 10
+        '000001': pd.DataFrame({'date': dates, 'signal': [0, 1, 0, 0, 0, 0, 0, 0, 1, -1]}),
+        # No signals at all
+        '000002': pd.DataFrame({'date': dates, 'signal': [0] * 10}),
+        # A recent buy signal, stock missing from the name/industry maps
+        '600000': pd.DataFrame({'date': dates, 'signal': [0] * 7 + [1, 0, 0]}),
+    }
+
+def test_filter_signals_recent_buy(mock_signal_data):
+    """Tests that only recent buy signals are returned, with names and industries mapped."""
+    names = {'000001': '平安银行', '000002': '万科A'}
+    industries = {'000001': '银行', '000002': '房地产'}
+
+    found = filter_signals(mock_signal_data, names, industries, signal_type='buy', recent_days=5)
+
+    assert found.sort_values('stock_code').to_dict(orient='records') == [
+        {'stock_code': '000001', 'stock_name': '平安银行', 'industry': '银行',
+         'signal_date': '2024-01-09', 'signal_type': 'buy'},
+        {'stock_code': '600000', 'stock_name': '未知名称', 'industry': '未知行业',
+         'signal_date': '2024-01-08', 'signal_type': 'buy'},
+    ]
+
+def test_filter_signals_sell_and_empty(mock_signal_data):
+    """Tests sell filtering and that no signals yields an empty result."""
+    found = filter_signals(mock_signal_data, {}, {}, signal_type='sell', recent_days=1)
+    assert found['signal_date'].tolist() == ['2024-01-10']
+
+    empty = filter_signals({'000002': mock_signal_data['000002']}, {}, {}, 'buy', 5)
+    assert empty.empty
+    assert list(empty.columns) == ['stock_code', 'stock_name', 'industry', 'signal_date', 'signal_type']
+
+def test_batch_apply_strategy_small_batch_runs_serially():
+    """Tests that a small batch is processed in-process, keeping slim results and dropping failures."""
+    rng = np.random.default_rng(0)
+    n = 300
+    close = 10 + np.cumsum(rng.normal(0, 0.1, n))
+    ohlcv = pd.DataFrame({
+        'date': pd.date_range(start='2023-01-01', periods=n),
+        'open': close, 'high': close + 0.1, 'low': close - 0.1, 'close': close,
+        'volume': rng.integers(1000, 5000, n).astype(float),
+    })
+
+    processed = batch_apply_strategy({'000001': ohlcv, '000002': pd.DataFrame({'date': []})})
+
+    assert list(processed) == ['000001']
+    assert list(processed['000001'].columns) == ['date', 'signal']
+    assert len(processed['000001']) == n
+
+def make_fake_get_stock_daily(failures, calls, delay=0.0, empty=()):
+    """
+    Builds a get_stock_daily stub: each code fails failures[code] times before succeeding,
+    codes in empty have no data, and every call is recorded in calls.
+    """
+    def fake_get_stock_daily(stock_code, start_date, end_date, raise_errors=False):
+        calls.append(stock_code)
+        time.sleep(delay)
+        if calls.count(stock_code) <= failures.get(stock_code, 0):
+            raise ConnectionError(f"{stock_code} throttled")
+        if stock_code in empty:
+            return pd.DataFrame()
+        return pd.DataFrame({'date': pd.to_datetime(['2024-01-02']), 'close': [1.0]})
+    return fake_get_stock_daily
+
+def test_batch_get_stock_daily_retries_and_keeps_input_order(monkeypatch):
+    """Tests retry-then-success, giving up after max_retries, no retry on empty data, and input order."""
+    calls = []
+    fake = make_fake_get_stock_daily({'000002': 1, '000003': 99}, calls, empty={'000004'})
+    monkeypatch.setattr(screening_handler, 'get_stock_daily', fake)
+
+    codes = ['000005', '000002', '000003', '000004', '000001']
+    data = batch_get_stock_daily(codes, '20240101', '20240110', max_retries=2, initial_delay=0.01, max_workers=4)
+
+    assert list(data) == ['000005', '000002', '000001']
+    assert calls.count('000002') == 2
+    assert calls.count('000003') == 3  # first attempt plus max_retries
+    assert calls.count('000004') == 1
+
+def test_batch_get_stock_daily_does_not_spin_while_slots_are_busy(monkeypatch):
+    """Tests that a due retry with every slot busy blocks on completions instead of polling wait()."""
+    calls = []
+    fake = make_fake_get_stock_daily({'000000': 1}, calls, delay=0.05)
+    monkeypatch.setattr(screening_handler, 'get_stock_daily', fake)
+
+    wait_calls = []
+    real_wait = concurrent.futures.wait
+    def counting_wait(*args, **kwargs):
+        wait_calls.append(kwargs.get('timeout'))
+        return real_wait(*args, **kwargs)
+    monkeypatch.setattr(screening_handler.concurrent.futures, 'wait', counting_wait)
+
+    codes = [f"{i:06d}" for i in range(20)]
+    data = batch_get_stock_daily(codes, '20240101', '20240110', initial_delay=0.01, max_workers=4)
+
+    assert list(data) == codes
+    # Roughly one wait per completion; the busy-wait issued thousands
+    assert len(wait_calls) <= 2 * len(calls)
+
+def fetch_concurrency_steps(caplog, monkeypatch, failures, from_cache=False):
+    """Runs a stubbed 40-stock fetch adjusting every 10 requests and returns the logged concurrency levels."""
+    monkeypatch.setattr(screening_handler, 'get_stock_daily', make_fake_get_stock_daily(failures, []))
+    monkeypatch.setattr(screening_handler, 'last_call_was_cached', lambda: from_cache)
+    monkeypatch.setattr(screening_handler, 'CONCURRENCY_ADJUST_EVERY', 10)
+    codes = [f"{i:06d}" for i in range(40)]
+    with caplog.at_level(logging.DEBUG, logger=screening_handler.logger.name):
+        batch_get_stock_daily(codes, '20240101', '20240110', initial_delay=0.001, max_workers=8)
+    return [r.args[2] for r in caplog.records if r.getMessage().startswith("最近")]
+
+def test_batch_get_stock_daily_adapts_concurrency(caplog, monkeypatch):
+    """Tests that concurrency grows on clean windows, shrinks on retries, and ignores cache hits."""
+    assert fetch_concurrency_steps(caplog, monkeypatch, {}) == [10, 12, 14, 16]
+    caplog.clear()
+
+    every_code_fails_once = {f"{i:06d}": 1 for i in range(40)}
+    assert fetch_concurrency_steps(caplog, monkeypatch, every_code_fails_once) == [6, 4, 4, 4]
+    caplog.clear()
+
+    assert fetch_concurrency_steps(caplog, monkeypatch, {}, from_cache=True) == []
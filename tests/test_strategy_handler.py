@@ -9,7 +9,7 @@ import numpy as np
 import pytest
 
 # Add src to the path to allow direct import of our modules
-from src.strategy_handler import apply_oversold_reversal_strategy
+from src.strategy_handler import apply_oversold_reversal_strategy, apply_five_step_integrated_strategy
 
 @pytest.fixture
 def mock_analyzed_data():
@@ -54,3 +54,20 @@ def test_strategy_with_no_signals(mock_analyzed_data):
     
     # Assert that no buy signals (1) are present
     assert 1 not in df_with_signals['signal'].tolist()
+
+
+def test_five_step_strategy_with_short_history():
+    """Tests that fewer bars than the 20-day volume window yield no signals instead of an error."""
+    n = 10
+    df = pd.DataFrame({
+        'date': pd.date_range(start='2024-01-01', periods=n),
+        'close': np.linspace(10.0, 12.0, n),
+        'ma20': np.full(n, np.nan),
+        'macdhist': np.linspace(-0.1, 0.1, n),
+        'rsi': np.full(n, 50.0),
+        'volume': np.full(n, 1000.0),
+    })
+
+    df_with_signals = apply_five_step_integrated_strategy(df)
+
+    assert df_with_signals['signal'].tolist() == [0] * n